@@ -4,6 +4,7 @@ import os
 from dotenv import load_dotenv
 
 from plugin_manager import PluginManager
+from utils import parse_user_ids
 from openai_helper import OpenAIHelper, default_max_tokens, are_functions_available
 from telegram_bot import ChatGPTTelegramBot
 
@@ -68,10 +69,14 @@ def main():
         logging.warning('The environment variable MONTHLY_GUEST_BUDGET is deprecated. '
                         'Please use GUEST_BUDGET with BUDGET_PERIOD instead.')
 
+    allowed_user_ids = parse_user_ids(os.environ.get('ALLOWED_TELEGRAM_USER_IDS', '*'))
     telegram_config = {
         'token': os.environ['TELEGRAM_BOT_TOKEN'],
         'admin_user_ids': os.environ.get('ADMIN_USER_IDS', '-'),
+        'parsed_admin_user_ids': frozenset(parse_user_ids(os.environ.get('ADMIN_USER_IDS', '-'))),
         'allowed_user_ids': os.environ.get('ALLOWED_TELEGRAM_USER_IDS', '*'),
+        'parsed_allowed_user_ids': allowed_user_ids,
+        'allowed_user_ids_set': frozenset(allowed_user_ids),
         'enable_quoting': os.environ.get('ENABLE_QUOTING', 'true').lower() == 'true',
         'enable_image_generation': os.environ.get('ENABLE_IMAGE_GENERATION', 'true').lower() == 'true',
         'enable_transcription': os.environ.get('ENABLE_TRANSCRIPTION', 'true').lower() == 'true',
@@ -81,10 +86,14 @@ def main():
         'guest_budget': float(os.environ.get('GUEST_BUDGET', os.environ.get('MONTHLY_GUEST_BUDGET', '100.0'))),
         'stream': os.environ.get('STREAM', 'true').lower() == 'true',
         'proxy': os.environ.get('PROXY', None),
+        'webhook_url': os.environ.get('WEBHOOK_URL', ''),
+        'webhook_port': int(os.environ.get('WEBHOOK_PORT', 8443)),
+        'webhook_secret': os.environ.get('WEBHOOK_SECRET', None),
         'voice_reply_transcript': os.environ.get('VOICE_REPLY_WITH_TRANSCRIPT_ONLY', 'false').lower() == 'true',
         'voice_reply_prompts': os.environ.get('VOICE_REPLY_PROMPTS', '').split(';'),
         'ignore_group_transcriptions': os.environ.get('IGNORE_GROUP_TRANSCRIPTIONS', 'true').lower() == 'true',
         'group_trigger_keyword': os.environ.get('GROUP_TRIGGER_KEYWORD', ''),
+        'group_cache_ttl': int(os.environ.get('GROUP_CACHE_TTL', 60)),
         'token_price': float(os.environ.get('TOKEN_PRICE', 0.002)),
         'image_prices': [float(i) for i in os.environ.get('IMAGE_PRICES', "0.016,0.018,0.02").split(",")],
         'image_receive_mode': os.environ.get('IMAGE_FORMAT', "photo"),
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Dict
 
 import requests
@@ -27,4 +28,5 @@ class CryptoPlugin(Plugin):
         }]
 
     async def execute(self, function_name, **kwargs) -> Dict:
-        return requests.get(f"https://api.coincap.io/v2/rates/{kwargs['asset']}").json()
+        url = f"https://api.coincap.io/v2/rates/{kwargs['asset']}"
+        return (await asyncio.to_thread(requests.get, url)).json()
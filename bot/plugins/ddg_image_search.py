@@ -1,3 +1,4 @@
+import asyncio
 import os
 import random
 from itertools import islice
@@ -50,25 +51,29 @@ class DDGImageSearchPlugin(Plugin):
         }]
 
     async def execute(self, function_name, **kwargs) -> Dict:
-        with DDGS() as ddgs:
-            image_type = kwargs.get('type', 'photo')
-            ddgs_images_gen = ddgs.images(
-                kwargs['query'],
-                region=kwargs.get('region', 'wt-wt'),
-                safesearch=self.safesearch,
-                type_image=image_type,
-            )
-            results = list(islice(ddgs_images_gen, 10))
-            if not results or len(results) == 0:
-                return {"result": "No results found"}
+        image_type = kwargs.get('type', 'photo')
 
-            # Shuffle the results to avoid always returning the same image
-            random.shuffle(results)
+        def _search():
+            with DDGS() as ddgs:
+                ddgs_images_gen = ddgs.images(
+                    kwargs['query'],
+                    region=kwargs.get('region', 'wt-wt'),
+                    safesearch=self.safesearch,
+                    type_image=image_type,
+                )
+                return list(islice(ddgs_images_gen, 10))
 
-            return {
-                'direct_result': {
-                    'kind': image_type,
-                    'format': 'url',
-                    'value': results[0]['image']
-                }
+        results = await asyncio.to_thread(_search)
+        if not results or len(results) == 0:
+            return {"result": "No results found"}
+
+        # Shuffle the results to avoid always returning the same image
+        random.shuffle(results)
+
+        return {
+            'direct_result': {
+                'kind': image_type,
+                'format': 'url',
+                'value': results[0]['image']
             }
+        }
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Dict
 
 from duckduckgo_search import DDGS
@@ -27,5 +28,8 @@ class DDGTranslatePlugin(Plugin):
         }]
 
     async def execute(self, function_name, **kwargs) -> Dict:
-        with DDGS() as ddgs:
-            return ddgs.translate(kwargs['text'], to=kwargs['to_language'])
+        def _translate():
+            with DDGS() as ddgs:
+                return ddgs.translate(kwargs['text'], to=kwargs['to_language'])
+
+        return await asyncio.to_thread(_translate)
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from itertools import islice
 from typing import Dict
@@ -47,21 +48,24 @@ class DDGWebSearchPlugin(Plugin):
         }]
 
     async def execute(self, function_name, **kwargs) -> Dict:
-        with DDGS() as ddgs:
-            ddgs_gen = ddgs.text(
-                kwargs['query'],
-                region=kwargs.get('region', 'wt-wt'),
-                safesearch=self.safesearch
-            )
-            results = list(islice(ddgs_gen, 3))
+        def _search():
+            with DDGS() as ddgs:
+                ddgs_gen = ddgs.text(
+                    kwargs['query'],
+                    region=kwargs.get('region', 'wt-wt'),
+                    safesearch=self.safesearch
+                )
+                return list(islice(ddgs_gen, 3))
 
-            if results is None or len(results) == 0:
-                return {"Result": "No good DuckDuckGo Search Result was found"}
+        results = await asyncio.to_thread(_search)
 
-            def to_metadata(result: Dict) -> Dict[str, str]:
-                return {
-                    "snippet": result["body"],
-                    "title": result["title"],
-                    "link": result["href"],
-                }
-            return {"result": [to_metadata(result) for result in results]}
+        if results is None or len(results) == 0:
+            return {"Result": "No good DuckDuckGo Search Result was found"}
+
+        def to_metadata(result: Dict) -> Dict[str, str]:
+            return {
+                "snippet": result["body"],
+                "title": result["title"],
+                "link": result["href"],
+            }
+        return {"result": [to_metadata(result) for result in results]}
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from typing import Dict
 
@@ -48,4 +49,5 @@ class DeeplTranslatePlugin(Plugin):
             "text": kwargs['text'],
             "target_lang": kwargs['to_language']
         }
-        return requests.post(url, headers=headers, data=data).json()["translations"][0]["text"]
+        response = await asyncio.to_thread(requests.post, url, headers=headers, data=data)
+        return response.json()["translations"][0]["text"]
@@ -1,4 +1,5 @@
-import datetime
+import asyncio
+import os
 from typing import Dict
 
 from gtts import gTTS
@@ -33,12 +34,18 @@ class GTTSTextToSpeech(Plugin):
 
     async def execute(self, function_name, **kwargs) -> Dict:
         tts = gTTS(kwargs['text'], lang=kwargs.get('lang', 'en'))
-        output = f'gtts_{datetime.datetime.now().timestamp()}.mp3'
-        tts.save(output)
+        output = self.create_temp_file(prefix='gtts_', suffix='.mp3')
+        try:
+            await asyncio.to_thread(tts.save, output)
+        except Exception:
+            if os.path.exists(output):
+                os.remove(output)
+            raise
         return {
             'direct_result': {
                 'kind': 'file',
                 'format': 'path',
-                'value': output
+                'value': output,
+                'filename': 'gtts.mp3'
             }
         }
@@ -1,3 +1,5 @@
+import os
+import tempfile
 from abc import abstractmethod, ABC
 from typing import Dict
 
@@ -28,3 +30,13 @@ class Plugin(ABC):
         Execute the plugin and return a JSON serializable response
         """
         pass
+
+    def create_temp_file(self, prefix: str = '', suffix: str = '', in_memory: bool = True) -> str:
+        """
+        Create an empty temporary file for an intermediate result and return its path.
+        If `in_memory` is set, the file is placed in RAM-backed /dev/shm when available. Only use it for
+        small outputs, as /dev/shm is limited (64 MB by default in Docker). The file is deleted once sent to the user.
+        """
+        temp_dir = '/dev/shm' if in_memory and os.path.isdir('/dev/shm') else None
+        with tempfile.NamedTemporaryFile(prefix=prefix, suffix=suffix, dir=temp_dir, delete=False) as temp_file:
+            return temp_file.name
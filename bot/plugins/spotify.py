@@ -1,3 +1,4 @@
+import asyncio
 import os
 from typing import Dict
 
@@ -116,19 +117,19 @@ class SpotifyPlugin(Plugin):
         limit = kwargs.get('limit', 5)
 
         if function_name == 'spotify_get_currently_playing_song':
-            return self.fetch_currently_playing()
+            return await asyncio.to_thread(self.fetch_currently_playing)
         elif function_name == 'spotify_get_users_top_artists':
-            return self.fetch_top_artists(time_range, limit)
+            return await asyncio.to_thread(self.fetch_top_artists, time_range, limit)
         elif function_name == 'spotify_get_users_top_tracks':
-            return self.fetch_top_tracks(time_range, limit)
+            return await asyncio.to_thread(self.fetch_top_tracks, time_range, limit)
         elif function_name == 'spotify_search_by_query':
             query = kwargs.get('query', '')
             search_type = kwargs.get('type', 'track')
-            return self.search_by_query(query, search_type, limit)
+            return await asyncio.to_thread(self.search_by_query, query, search_type, limit)
         elif function_name == 'spotify_lookup_by_id':
             content_id = kwargs.get('id')
             search_type = kwargs.get('type', 'track')
-            return self.search_by_id(content_id, search_type)
+            return await asyncio.to_thread(self.search_by_id, content_id, search_type)
 
     def fetch_currently_playing(self) -> Dict:
         """
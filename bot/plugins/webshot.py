@@ -1,4 +1,4 @@
-import os, requests, random, string
+import asyncio, os, requests
 from typing import Dict
 from .plugin import Plugin
 
@@ -21,26 +21,19 @@ class WebshotPlugin(Plugin):
                 "required": ["url"],
             },
         }]
-    
-    def generate_random_string(self, length):
-        characters = string.ascii_letters + string.digits
-        return ''.join(random.choice(characters) for _ in range(length))
 
     async def execute(self, function_name, **kwargs) -> Dict:
         try:
             image_url = f'https://image.thum.io/get/maxAge/12/width/720/{kwargs["url"]}'
             
             # preload url first
-            requests.get(image_url)
+            await asyncio.to_thread(requests.get, image_url)
 
             # download the actual image
-            response = requests.get(image_url, timeout=30)
+            response = await asyncio.to_thread(requests.get, image_url, timeout=30)
 
             if response.status_code == 200:
-                if not os.path.exists("uploads/webshot"):
-                    os.makedirs("uploads/webshot")
-
-                image_file_path = os.path.join("uploads/webshot", f"{self.generate_random_string(15)}.png")
+                image_file_path = self.create_temp_file(prefix='webshot_', suffix='.png')
                 with open(image_file_path, "wb") as f:
                     f.write(response.content)
 
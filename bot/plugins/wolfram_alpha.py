@@ -1,3 +1,4 @@
+import asyncio
 import os
 from typing import Dict
 
@@ -34,7 +35,7 @@ class WolframAlphaPlugin(Plugin):
 
     async def execute(self, function_name, **kwargs) -> Dict:
         client = wolframalpha.Client(self.app_id)
-        res = client.query(kwargs['query'])
+        res = await asyncio.to_thread(client.query, kwargs['query'])
         try:
             assumption = next(res.pods).text
             answer = next(res.results).text
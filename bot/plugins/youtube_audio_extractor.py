@@ -1,4 +1,6 @@
+import asyncio
 import logging
+import os
 import re
 from typing import Dict
 
@@ -30,18 +32,26 @@ class YouTubeAudioExtractorPlugin(Plugin):
 
     async def execute(self, function_name, **kwargs) -> Dict:
         link = kwargs['youtube_link']
+        output = None
         try:
             video = YouTube(link)
-            audio = video.streams.filter(only_audio=True, file_extension='mp4').first()
-            output = re.sub(r'[^\w\-_\. ]', '_', video.title) + '.mp3'
-            audio.download(filename=output)
+            # pytube fetches the video metadata lazily and synchronously
+            audio, title = await asyncio.to_thread(
+                lambda: (video.streams.filter(only_audio=True, file_extension='mp4').first(), video.title)
+            )
+            # The audio size is unbounded, so keep it on disk rather than in /dev/shm
+            output = self.create_temp_file(prefix='youtube_', suffix='.mp3', in_memory=False)
+            await asyncio.to_thread(audio.download, filename=output)
             return {
                 'direct_result': {
                     'kind': 'file',
                     'format': 'path',
-                    'value': output
+                    'value': output,
+                    'filename': re.sub(r'[^\w\-_\. ]', '_', title) + '.mp3'
                 }
             }
         except Exception as e:
             logging.warning(f'Failed to extract audio from YouTube video: {str(e)}')
+            if output and os.path.exists(output):
+                os.remove(output)
             return {'result': 'Failed to extract audio'}
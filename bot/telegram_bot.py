@@ -2,25 +2,29 @@ from __future__ import annotations
 
 import asyncio
 import logging
-import os
 
+from urllib.parse import urlparse
 from uuid import uuid4
 from telegram import BotCommandScopeAllGroupChats, Update, constants
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton, InlineQueryResultArticle
 from telegram import InputTextMessageContent, BotCommand
-from telegram.error import RetryAfter, TimedOut
+from telegram.error import RetryAfter, TimedOut, TelegramError
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, \
     filters, InlineQueryHandler, CallbackQueryHandler, Application, ContextTypes, CallbackContext
 
-from pydub import AudioSegment
-
 from utils import is_group_chat, get_thread_id, message_text, wrap_with_indicator, split_into_chunks, \
     edit_message_with_retry, get_stream_cutoff_values, is_allowed, get_remaining_budget, is_admin, is_within_budget, \
     get_reply_to_message_id, add_chat_request_to_usage_tracker, error_handler, is_direct_result, handle_direct_result, \
-    cleanup_intermediate_files
+    cleanup_intermediate_files, convert_to_mp3
 from openai_helper import OpenAIHelper, localized_text
 from usage_tracker import UsageTracker
 
+# Message filters used by the handlers, built once at import time
+TEXT_FILTER = filters.TEXT & ~filters.COMMAND
+MEDIA_FILTER = filters.AUDIO | filters.VOICE | filters.Document.AUDIO | \
+    filters.VIDEO | filters.VIDEO_NOTE | filters.Document.VIDEO
+GROUP_CHAT_FILTER = filters.ChatType.GROUP | filters.ChatType.SUPERGROUP
+
 
 class ChatGPTTelegramBot:
     """
@@ -81,13 +85,13 @@ class ChatGPTTelegramBot:
         Returns token usage statistics for current day and month.
         """
         if not await is_allowed(self.config, update, context):
-            logging.warning(f'User {update.message.from_user.name} (id: {update.message.from_user.id}) '
-                            f'is not allowed to request their usage statistics')
+            logging.warning('User %s (id: %s) is not allowed to request their usage statistics',
+                            update.message.from_user.name, update.message.from_user.id)
             await self.send_disallowed_message(update, context)
             return
 
-        logging.info(f'User {update.message.from_user.name} (id: {update.message.from_user.id}) '
-                     f'requested their usage statistics')
+        logging.info('User %s (id: %s) requested their usage statistics',
+                     update.message.from_user.name, update.message.from_user.id)
 
         user_id = update.message.from_user.id
         if user_id not in self.usage:
@@ -176,15 +180,15 @@ class ChatGPTTelegramBot:
         Resend the last request
         """
         if not await is_allowed(self.config, update, context):
-            logging.warning(f'User {update.message.from_user.name}  (id: {update.message.from_user.id})'
-                            f' is not allowed to resend the message')
+            logging.warning('User %s (id: %s) is not allowed to resend the message',
+                            update.message.from_user.name, update.message.from_user.id)
             await self.send_disallowed_message(update, context)
             return
 
         chat_id = update.effective_chat.id
         if chat_id not in self.last_message:
-            logging.warning(f'User {update.message.from_user.name} (id: {update.message.from_user.id})'
-                            f' does not have anything to resend')
+            logging.warning('User %s (id: %s) does not have anything to resend',
+                            update.message.from_user.name, update.message.from_user.id)
             await update.effective_message.reply_text(
                 message_thread_id=get_thread_id(update),
                 text=localized_text('resend_failed', self.config['bot_language'])
@@ -192,8 +196,8 @@ class ChatGPTTelegramBot:
             return
 
         # Update message text, clear self.last_message and send the request to prompt
-        logging.info(f'Resending the last prompt from user: {update.message.from_user.name} '
-                     f'(id: {update.message.from_user.id})')
+        logging.info('Resending the last prompt from user: %s (id: %s)',
+                     update.message.from_user.name, update.message.from_user.id)
         with update.message._unfrozen() as message:
             message.text = self.last_message.pop(chat_id)
 
@@ -204,13 +208,13 @@ class ChatGPTTelegramBot:
         Resets the conversation.
         """
         if not await is_allowed(self.config, update, context):
-            logging.warning(f'User {update.message.from_user.name} (id: {update.message.from_user.id}) '
-                            f'is not allowed to reset the conversation')
+            logging.warning('User %s (id: %s) is not allowed to reset the conversation',
+                            update.message.from_user.name, update.message.from_user.id)
             await self.send_disallowed_message(update, context)
             return
 
-        logging.info(f'Resetting the conversation for user {update.message.from_user.name} '
-                     f'(id: {update.message.from_user.id})...')
+        logging.info('Resetting the conversation for user %s (id: %s)...',
+                     update.message.from_user.name, update.message.from_user.id)
 
         chat_id = update.effective_chat.id
         reset_content = message_text(update.message)
@@ -228,7 +232,7 @@ class ChatGPTTelegramBot:
                 or not await self.check_allowed_and_within_budget(update, context):
             return
 
-        image_query = message_text(update.message)
+        image_query = ' '.join(context.args).strip()
         if image_query == '':
             await update.effective_message.reply_text(
                 message_thread_id=get_thread_id(update),
@@ -236,8 +240,8 @@ class ChatGPTTelegramBot:
             )
             return
 
-        logging.info(f'New image generation request received from user {update.message.from_user.name} '
-                     f'(id: {update.message.from_user.id})')
+        logging.info('New image generation request received from user %s (id: %s)',
+                     update.message.from_user.name, update.message.from_user.id)
 
         async def _generate():
             try:
@@ -258,7 +262,7 @@ class ChatGPTTelegramBot:
                 user_id = update.message.from_user.id
                 self.usage[user_id].add_image_request(image_size, self.config['image_prices'])
                 # add guest chat request to guest usage tracker
-                if str(user_id) not in self.config['allowed_user_ids'].split(',') and 'guests' in self.usage:
+                if user_id not in self.config['allowed_user_ids_set'] and 'guests' in self.usage:
                     self.usage["guests"].add_image_request(image_size, self.config['image_prices'])
 
             except Exception as e:
@@ -288,8 +292,8 @@ class ChatGPTTelegramBot:
             )
             return
 
-        logging.info(f'New speech generation request received from user {update.message.from_user.name} '
-                     f'(id: {update.message.from_user.id})')
+        logging.info('New speech generation request received from user %s (id: %s)',
+                     update.message.from_user.name, update.message.from_user.id)
 
         async def _generate():
             try:
@@ -304,7 +308,7 @@ class ChatGPTTelegramBot:
                 user_id = update.message.from_user.id
                 self.usage[user_id].add_tts_request(text_length, self.config['tts_model'], self.config['tts_prices'])
                 # add guest chat request to guest usage tracker
-                if str(user_id) not in self.config['allowed_user_ids'].split(',') and 'guests' in self.usage:
+                if user_id not in self.config['allowed_user_ids_set'] and 'guests' in self.usage:
                     self.usage["guests"].add_tts_request(text_length, self.config['tts_model'], self.config['tts_prices'])
 
             except Exception as e:
@@ -326,19 +330,22 @@ class ChatGPTTelegramBot:
             return
 
         if is_group_chat(update) and self.config['ignore_group_transcriptions']:
-            logging.info(f'Transcription coming from group chat, ignoring...')
+            logging.info('Transcription coming from group chat, ignoring...')
             return
 
         chat_id = update.effective_chat.id
-        filename = update.message.effective_attachment.file_unique_id
 
         async def _execute():
-            filename_mp3 = f'{filename}.mp3'
             bot_language = self.config['bot_language']
             try:
-                media_file = await context.bot.get_file(update.message.effective_attachment.file_id)
-                await media_file.download_to_drive(filename)
-            except Exception as e:
+                attachment = update.message.effective_attachment
+                media_file = await context.bot.get_file(attachment.file_id)
+                audio_file, duration_seconds = await convert_to_mp3(media_file.file_path, proxy=self.config['proxy'],
+                                                                    mime_type=getattr(attachment, 'mime_type', None))
+                logging.info('New transcribe request received from user %s (id: %s)',
+                             update.message.from_user.name, update.message.from_user.id)
+
+            except TelegramError as e:
                 logging.exception(e)
                 await update.effective_message.reply_text(
                     message_thread_id=get_thread_id(update),
@@ -351,12 +358,6 @@ class ChatGPTTelegramBot:
                 )
                 return
 
-            try:
-                audio_track = AudioSegment.from_file(filename)
-                audio_track.export(filename_mp3, format="mp3")
-                logging.info(f'New transcribe request received from user {update.message.from_user.name} '
-                             f'(id: {update.message.from_user.id})')
-
             except Exception as e:
                 logging.exception(e)
                 await update.effective_message.reply_text(
@@ -364,8 +365,6 @@ class ChatGPTTelegramBot:
                     reply_to_message_id=get_reply_to_message_id(self.config, update),
                     text=localized_text('media_type_fail', bot_language)
                 )
-                if os.path.exists(filename):
-                    os.remove(filename)
                 return
 
             user_id = update.message.from_user.id
@@ -373,14 +372,14 @@ class ChatGPTTelegramBot:
                 self.usage[user_id] = UsageTracker(user_id, update.message.from_user.name)
 
             try:
-                transcript = await self.openai.transcribe(filename_mp3)
+                transcript = await self.openai.transcribe(audio_file)
 
                 transcription_price = self.config['transcription_price']
-                self.usage[user_id].add_transcription_seconds(audio_track.duration_seconds, transcription_price)
+                self.usage[user_id].add_transcription_seconds(duration_seconds, transcription_price)
 
-                allowed_user_ids = self.config['allowed_user_ids'].split(',')
-                if str(user_id) not in allowed_user_ids and 'guests' in self.usage:
-                    self.usage["guests"].add_transcription_seconds(audio_track.duration_seconds, transcription_price)
+                allowed_user_ids = self.config['allowed_user_ids_set']
+                if user_id not in allowed_user_ids and 'guests' in self.usage:
+                    self.usage["guests"].add_transcription_seconds(duration_seconds, transcription_price)
 
                 # check if transcript starts with any of the prefixes
                 response_to_transcription = any(transcript.lower().startswith(prefix.lower()) if prefix else False
@@ -404,7 +403,7 @@ class ChatGPTTelegramBot:
                     response, total_tokens = await self.openai.get_chat_response(chat_id=chat_id, query=transcript)
 
                     self.usage[user_id].add_chat_tokens(total_tokens, self.config['token_price'])
-                    if str(user_id) not in allowed_user_ids and 'guests' in self.usage:
+                    if user_id not in allowed_user_ids and 'guests' in self.usage:
                         self.usage["guests"].add_chat_tokens(total_tokens, self.config['token_price'])
 
                     # Split into chunks of 4096 characters (Telegram's message limit)
@@ -430,11 +429,6 @@ class ChatGPTTelegramBot:
                     text=f"{localized_text('transcribe_fail', bot_language)}: {str(e)}",
                     parse_mode=constants.ParseMode.MARKDOWN
                 )
-            finally:
-                if os.path.exists(filename_mp3):
-                    os.remove(filename_mp3)
-                if os.path.exists(filename):
-                    os.remove(filename)
 
         await wrap_with_indicator(update, context, _execute, constants.ChatAction.TYPING)
 
@@ -448,8 +442,8 @@ class ChatGPTTelegramBot:
         if not await self.check_allowed_and_within_budget(update, context):
             return
 
-        logging.info(
-            f'New message received from user {update.message.from_user.name} (id: {update.message.from_user.id})')
+        logging.info('New message received from user %s (id: %s)',
+                     update.message.from_user.name, update.message.from_user.id)
         chat_id = update.effective_chat.id
         user_id = update.message.from_user.id
         prompt = message_text(update.message)
@@ -477,10 +471,11 @@ class ChatGPTTelegramBot:
             total_tokens = 0
 
             if self.config['stream']:
-                await update.effective_message.reply_chat_action(
+                # Send the typing action while the request to OpenAI is already being made
+                context.application.create_task(update.effective_message.reply_chat_action(
                     action=constants.ChatAction.TYPING,
                     message_thread_id=get_thread_id(update)
-                )
+                ), update=update)
 
                 stream_response = self.openai.get_chat_response_stream(chat_id=chat_id, query=prompt)
                 i = 0
@@ -645,7 +640,7 @@ class ChatGPTTelegramBot:
 
             await update.inline_query.answer([inline_query_result], cache_time=0)
         except Exception as e:
-            logging.error(f'An error occurred while generating the result card for inline query {e}')
+            logging.error('An error occurred while generating the result card for inline query %s', e)
 
     async def handle_callback_inline_query(self, update: Update, context: CallbackContext):
         """
@@ -749,7 +744,7 @@ class ChatGPTTelegramBot:
                                                             text=f'{query}\n\n_{answer_tr}:_\n{loading_tr}',
                                                             parse_mode=constants.ParseMode.MARKDOWN)
 
-                        logging.info(f'Generating response for inline query by {name}')
+                        logging.info('Generating response for inline query by %s', name)
                         response, total_tokens = await self.openai.get_chat_response(chat_id=user_id, query=query)
 
                         if is_direct_result(response):
@@ -775,7 +770,7 @@ class ChatGPTTelegramBot:
                 add_chat_request_to_usage_tracker(self.usage, self.config, user_id, total_tokens)
 
         except Exception as e:
-            logging.error(f'Failed to respond to an inline query via button callback: {e}')
+            logging.error('Failed to respond to an inline query via button callback: %s', e)
             logging.exception(e)
             localized_answer = localized_text('chat_fail', self.config['bot_language'])
             await edit_message_with_retry(context, chat_id=None, message_id=inline_message_id,
@@ -795,11 +790,11 @@ class ChatGPTTelegramBot:
         user_id = update.inline_query.from_user.id if is_inline else update.message.from_user.id
 
         if not await is_allowed(self.config, update, context, is_inline=is_inline):
-            logging.warning(f'User {name} (id: {user_id}) is not allowed to use the bot')
+            logging.warning('User %s (id: %s) is not allowed to use the bot', name, user_id)
             await self.send_disallowed_message(update, context, is_inline)
             return False
         if not is_within_budget(self.config, self.usage, update, is_inline=is_inline):
-            logging.warning(f'User {name} (id: {user_id}) reached their usage limit')
+            logging.warning('User %s (id: %s) reached their usage limit', name, user_id)
             await self.send_budget_reached_message(update, context, is_inline)
             return False
 
@@ -843,6 +838,12 @@ class ChatGPTTelegramBot:
         """
         Runs the bot indefinitely until the user presses Ctrl+C
         """
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            logging.info('uvloop is not available, using the default asyncio event loop')
+
         application = ApplicationBuilder() \
             .token(self.config['token']) \
             .proxy_url(self.config['proxy']) \
@@ -858,14 +859,9 @@ class ChatGPTTelegramBot:
         application.add_handler(CommandHandler('start', self.help))
         application.add_handler(CommandHandler('stats', self.stats))
         application.add_handler(CommandHandler('resend', self.resend))
-        application.add_handler(CommandHandler(
-            'chat', self.prompt, filters=filters.ChatType.GROUP | filters.ChatType.SUPERGROUP)
-        )
-        application.add_handler(MessageHandler(
-            filters.AUDIO | filters.VOICE | filters.Document.AUDIO |
-            filters.VIDEO | filters.VIDEO_NOTE | filters.Document.VIDEO,
-            self.transcribe))
-        application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), self.prompt))
+        application.add_handler(CommandHandler('chat', self.prompt, filters=GROUP_CHAT_FILTER))
+        application.add_handler(MessageHandler(MEDIA_FILTER, self.transcribe))
+        application.add_handler(MessageHandler(TEXT_FILTER, self.prompt))
         application.add_handler(InlineQueryHandler(self.inline_query, chat_types=[
             constants.ChatType.GROUP, constants.ChatType.SUPERGROUP, constants.ChatType.PRIVATE
         ]))
@@ -873,4 +869,13 @@ class ChatGPTTelegramBot:
 
         application.add_error_handler(error_handler)
 
-        application.run_polling()
+        if self.config.get('webhook_url'):
+            application.run_webhook(
+                listen='0.0.0.0',
+                port=self.config['webhook_port'],
+                url_path=urlparse(self.config['webhook_url']).path.lstrip('/'),
+                secret_token=self.config['webhook_secret'],
+                webhook_url=self.config['webhook_url']
+            )
+        else:
+            application.run_polling()
@@ -1,17 +1,28 @@
 from __future__ import annotations
 
 import asyncio
+import io
 import itertools
 import json
 import logging
 import os
+import tempfile
+import time
+from typing import AsyncIterator
 
+import httpx
 import telegram
 from telegram import Message, MessageEntity, Update, ChatMember, constants
 from telegram.ext import CallbackContext, ContextTypes
 
 from usage_tracker import UsageTracker
 
+# Maximum number of concurrent get_chat_member requests when authorizing group chat messages
+GROUP_MEMBERSHIP_CHECKS_LIMIT = 5
+
+# Containers that may store their index (moov atom) at the end of the file, which ffmpeg can't read from a pipe
+SEEKABLE_MIME_TYPES = ('video/mp4', 'video/quicktime', 'audio/mp4', 'audio/m4a', 'audio/x-m4a')
+
 
 def message_text(message: Message) -> str:
     """
@@ -28,20 +39,41 @@ def message_text(message: Message) -> str:
     return message_txt if len(message_txt) > 0 else ''
 
 
-async def is_user_in_group(update: Update, context: CallbackContext, user_id: int) -> bool:
+def get_cached_group_membership(context: CallbackContext, chat_id: int, user_id: int) -> bool | None:
+    """
+    Returns the cached group membership of user_id, or None if it is not cached or has expired
+    """
+    cached = context.bot_data.get('group_member_cache', {}).get((chat_id, user_id))
+    if cached is None or cached[1] <= time.monotonic():
+        return None
+    return cached[0] in [ChatMember.OWNER, ChatMember.ADMINISTRATOR, ChatMember.MEMBER]
+
+
+async def is_user_in_group(config, update: Update, context: CallbackContext, user_id: int) -> bool:
     """
-    Checks if user_id is a member of the group
+    Checks if user_id is a member of the group.
+    Membership statuses, including failed lookups, are cached in the bot data for `group_cache_ttl` seconds.
     """
+    chat_id = update.message.chat_id
+    cached = get_cached_group_membership(context, chat_id, user_id)
+    if cached is not None:
+        return cached
+
     try:
-        chat_member = await context.bot.get_chat_member(update.message.chat_id, user_id)
-        return chat_member.status in [ChatMember.OWNER, ChatMember.ADMINISTRATOR, ChatMember.MEMBER]
-    except telegram.error.BadRequest as e:
-        if str(e) == "User not found":
-            return False
-        else:
-            raise e
-    except Exception as e:
-        raise e
+        chat_member = await context.bot.get_chat_member(chat_id, user_id)
+        status = chat_member.status
+    except (telegram.error.RetryAfter, telegram.error.TimedOut):
+        # Transient errors, don't cache them
+        raise
+    except telegram.error.TelegramError as e:
+        # e.g. a stale or invalid user id, treat it as not a member
+        if str(e) != "User not found":
+            logging.warning(f'Failed to check group membership of user {user_id}: {str(e)}')
+        status = ChatMember.LEFT
+
+    member_cache = context.bot_data.setdefault('group_member_cache', {})
+    member_cache[(chat_id, user_id)] = (status, time.monotonic() + config.get('group_cache_ttl', 60))
+    return status in [ChatMember.OWNER, ChatMember.ADMINISTRATOR, ChatMember.MEMBER]
 
 
 def get_thread_id(update: Update) -> int | None:
@@ -65,6 +97,123 @@ def get_stream_cutoff_values(update: Update, content: str) -> int:
         else 25 if len(content) > 50 else 15
 
 
+async def stream_file(url: str, proxy: str | None = None, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """
+    Downloads a file in chunks, without buffering it on disk or in memory
+    :param url: The file URL (e.g. the `file_path` of a Telegram file)
+    :param proxy: The proxy to use, if any
+    :param chunk_size: The maximum size of each chunk in bytes
+    :return: An async iterator over the file content
+    """
+    try:
+        async with httpx.AsyncClient(proxies=proxy) as client:
+            async with client.stream('GET', url) as response:
+                if response.is_error:
+                    # Don't include the URL in the error, it contains the bot token
+                    raise telegram.error.NetworkError(f'{response.status_code} {response.reason_phrase}')
+                async for chunk in response.aiter_bytes(chunk_size):
+                    yield chunk
+    except httpx.HTTPError as e:
+        raise telegram.error.NetworkError(str(e)) from e
+
+
+async def convert_to_mp3(url: str, proxy: str | None = None, mime_type: str | None = None) -> tuple[io.BytesIO, float]:
+    """
+    Downloads an audio or video file and converts it to mp3 with ffmpeg.
+    Streamable formats are piped straight into ffmpeg. Formats that need seeking, or that ffmpeg
+    fails to read from the pipe, are downloaded to a temporary file first.
+    :param url: The file URL (e.g. the `file_path` of a Telegram file)
+    :param proxy: The proxy to use, if any
+    :param mime_type: The MIME type of the file, if known
+    :return: The mp3 audio as an in-memory file named `audio.mp3`, and its duration in seconds
+    """
+    if mime_type not in SEEKABLE_MIME_TYPES:
+        try:
+            return await ffmpeg_to_mp3('pipe:0', stream_file(url, proxy=proxy))
+        except telegram.error.TelegramError:
+            raise
+        except Exception as e:
+            logging.info(f'Failed to convert media from a pipe, retrying with a temporary file: {str(e)}')
+
+    # Not in /dev/shm, media files can be up to 20 MB and tmpfs is small (64 MB by default in Docker)
+    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+        filename = temp_file.name
+    try:
+        with open(filename, 'wb') as file:
+            media = stream_file(url, proxy=proxy)
+            try:
+                async for chunk in media:
+                    await asyncio.to_thread(file.write, chunk)
+            finally:
+                await media.aclose()
+        return await ffmpeg_to_mp3(filename)
+    finally:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+async def ffmpeg_to_mp3(source: str, media: AsyncIterator[bytes] | None = None) -> tuple[io.BytesIO, float]:
+    """
+    Converts an audio or video file to mp3 with ffmpeg
+    :param source: The ffmpeg input, either a file path or `pipe:0` to read from `media`
+    :param media: The content of the audio or video file in chunks, when reading from a pipe
+    :return: The mp3 audio as an in-memory file named `audio.mp3`, and its duration in seconds
+    """
+    process = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-loglevel', 'error', '-nostats', '-progress', 'pipe:2',
+        '-i', source, '-vn', '-f', 'mp3', '-codec:a', 'libmp3lame', '-q:a', '4', 'pipe:1',
+        stdin=asyncio.subprocess.PIPE if media is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+
+    # Read the output while feeding the input, otherwise ffmpeg blocks once the stdout pipe buffer is full
+    stdout_task = asyncio.create_task(process.stdout.read())
+    stderr_task = asyncio.create_task(process.stderr.read())
+    try:
+        if media is not None:
+            try:
+                async for chunk in media:
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                # ffmpeg exited early, e.g. because of an unsupported input. The error is reported below
+                pass
+            finally:
+                if hasattr(media, 'aclose'):
+                    await media.aclose()
+            process.stdin.close()
+        mp3, stderr = await asyncio.gather(stdout_task, stderr_task)
+        await process.wait()
+    except BaseException:
+        # Don't leave ffmpeg running if the download fails or the request is cancelled
+        if process.returncode is None:
+            process.kill()
+        await asyncio.gather(stdout_task, stderr_task, process.wait(), return_exceptions=True)
+        raise
+
+    # With `-progress`, stderr interleaves `key=value` progress reports with the error messages
+    duration = 0.0
+    errors = []
+    for line in stderr.decode(errors='replace').splitlines():
+        key, _, value = line.partition('=')
+        if key == 'out_time':
+            hours, minutes, seconds = value.split(':') if value.count(':') == 2 else ('0', '0', '0')
+            try:
+                duration = max(duration, int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+            except ValueError:
+                pass
+        elif not key.isidentifier() or not value:
+            errors.append(line)
+
+    if process.returncode != 0 or len(mp3) == 0:
+        raise Exception(f'ffmpeg failed with exit code {process.returncode}: {" ".join(errors)}')
+
+    audio_file = io.BytesIO(mp3)
+    audio_file.name = 'audio.mp3'
+    return audio_file, duration
+
+
 def is_group_chat(update: Update) -> bool:
     """
     Checks if the message was sent from a group chat
@@ -140,6 +289,23 @@ async def edit_message_with_retry(context: ContextTypes.DEFAULT_TYPE, chat_id: i
         raise e
 
 
+def parse_user_ids(user_ids: str) -> tuple[int, ...]:
+    """
+    Parses a comma separated list of Telegram user ids, keeping their order.
+    Surrounding whitespace is ignored, entries that are not numeric (e.g. `*` or `-`) are skipped.
+    :param user_ids: The comma separated list of user ids
+    :return: The user ids, in the order they were listed
+    """
+    parsed_user_ids = []
+    for user_id in user_ids.split(','):
+        user_id = user_id.strip()
+        if user_id.lstrip('-').isdigit():
+            parsed_user_ids.append(int(user_id))
+        elif user_id not in ('', '*', '-'):
+            logging.warning(f'Ignoring invalid user id: {user_id}')
+    return tuple(parsed_user_ids)
+
+
 async def error_handler(_: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Handles errors in the telegram-python-bot library.
@@ -158,19 +324,49 @@ async def is_allowed(config, update: Update, context: CallbackContext, is_inline
     if is_admin(config, user_id):
         return True
     name = update.inline_query.from_user.name if is_inline else update.message.from_user.name
-    allowed_user_ids = config['allowed_user_ids'].split(',')
+    allowed_user_ids = config['parsed_allowed_user_ids']
     # Check if user is allowed
-    if str(user_id) in allowed_user_ids:
+    if user_id in config['allowed_user_ids_set']:
         return True
     # Check if it's a group a chat with at least one authorized member
     if not is_inline and is_group_chat(update):
-        admin_user_ids = config['admin_user_ids'].split(',')
-        for user in itertools.chain(allowed_user_ids, admin_user_ids):
-            if not user.strip():
-                continue
-            if await is_user_in_group(update, context, user):
+        # Allowed users first, then admins that are not allowed users already
+        authorized_user_ids = list(dict.fromkeys(itertools.chain(allowed_user_ids,
+                                                                 sorted(config['parsed_admin_user_ids']))))
+
+        # Answer from the cache when possible, and only query the memberships that are missing or expired
+        uncached_user_ids = []
+        for user in authorized_user_ids:
+            is_member = get_cached_group_membership(context, update.message.chat_id, user)
+            if is_member:
                 logging.info(f'{user} is a member. Allowing group chat message...')
                 return True
+            if is_member is None:
+                uncached_user_ids.append(user)
+
+        semaphore = context.bot_data.setdefault('group_member_semaphore',
+                                                asyncio.Semaphore(GROUP_MEMBERSHIP_CHECKS_LIMIT))
+
+        async def _check_membership(user):
+            try:
+                async with semaphore:
+                    return user, await is_user_in_group(config, update, context, user)
+            except telegram.error.TelegramError as e:
+                logging.warning(f'Failed to check group membership of user {user}: {str(e)}')
+                return user, False
+
+        # Query the memberships concurrently and stop as soon as one authorized member is found
+        tasks = [asyncio.create_task(_check_membership(user)) for user in uncached_user_ids]
+        try:
+            for next_task in asyncio.as_completed(tasks):
+                user, is_member = await next_task
+                if is_member:
+                    logging.info(f'{user} is a member. Allowing group chat message...')
+                    return True
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
         logging.info(f'Group chat messages from user {name} '
                      f'(id: {user_id}) are not allowed')
     return False
@@ -181,18 +377,13 @@ def is_admin(config, user_id: int, log_no_admin=False) -> bool:
     Checks if the user is the admin of the bot.
     The first user in the user list is the admin.
     """
-    if config['admin_user_ids'] == '-':
+    if not config['parsed_admin_user_ids']:
         if log_no_admin:
             logging.info('No admin user defined.')
         return False
 
-    admin_user_ids = config['admin_user_ids'].split(',')
-
     # Check if user is in the admin user list
-    if str(user_id) in admin_user_ids:
-        return True
-
-    return False
+    return user_id in config['parsed_admin_user_ids']
 
 
 def get_user_budget(config, user_id) -> float | None:
@@ -215,9 +406,9 @@ def get_user_budget(config, user_id) -> float | None:
                             'only the first value is used as budget for everyone.')
         return float(user_budgets[0])
 
-    allowed_user_ids = config['allowed_user_ids'].split(',')
-    if str(user_id) in allowed_user_ids:
-        user_index = allowed_user_ids.index(str(user_id))
+    allowed_user_ids = config['parsed_allowed_user_ids']
+    if user_id in config['allowed_user_ids_set']:
+        user_index = allowed_user_ids.index(user_id)
         if len(user_budgets) <= user_index:
             logging.warning(f'No budget set for user id: {user_id}. Budget list shorter than user list.')
             return 0.0
@@ -293,8 +484,7 @@ def add_chat_request_to_usage_tracker(usage, config, user_id, used_tokens):
         # add chat request to users usage tracker
         usage[user_id].add_chat_tokens(used_tokens, config['token_price'])
         # add guest chat request to guest usage tracker
-        allowed_user_ids = config['allowed_user_ids'].split(',')
-        if str(user_id) not in allowed_user_ids and 'guests' in usage:
+        if user_id not in config['allowed_user_ids_set'] and 'guests' in usage:
             usage["guests"].add_chat_tokens(used_tokens, config['token_price'])
     except Exception as e:
         logging.warning(f'Failed to add tokens to usage_logs: {str(e)}')
@@ -346,21 +536,37 @@ async def handle_direct_result(config, update: Update, response: any):
         'reply_to_message_id': get_reply_to_message_id(config, update),
     }
 
-    if kind == 'photo':
-        if format == 'url':
-            await update.effective_message.reply_photo(**common_args, photo=value)
-        elif format == 'path':
-            await update.effective_message.reply_photo(**common_args, photo=open(value, 'rb'))
-    elif kind == 'gif' or kind == 'file':
-        if format == 'url':
-            await update.effective_message.reply_document(**common_args, document=value)
+    try:
+        if kind == 'photo':
+            if format == 'url':
+                await update.effective_message.reply_photo(**common_args, photo=value)
+            elif format == 'path':
+                photo = await read_intermediate_file(value)
+                await update.effective_message.reply_photo(**common_args, photo=photo)
+        elif kind == 'gif' or kind == 'file':
+            if format == 'url':
+                await update.effective_message.reply_document(**common_args, document=value)
+            if format == 'path':
+                document = await read_intermediate_file(value)
+                await update.effective_message.reply_document(**common_args, document=document,
+                                                              filename=result.get('filename', os.path.basename(value)))
+        elif kind == 'dice':
+            await update.effective_message.reply_dice(**common_args, emoji=value)
+    finally:
+        # Intermediate files may live in RAM (see `Plugin.create_temp_file`), always delete them
         if format == 'path':
-            await update.effective_message.reply_document(**common_args, document=open(value, 'rb'))
-    elif kind == 'dice':
-        await update.effective_message.reply_dice(**common_args, emoji=value)
+            cleanup_intermediate_files(response)
 
-    if format == 'path':
-        cleanup_intermediate_files(response)
+
+async def read_intermediate_file(path: str) -> bytes:
+    """
+    Reads a file created by a plugin in a worker thread, without blocking the event loop
+    """
+    def _read():
+        with open(path, 'rb') as file:
+            return file.read()
+
+    return await asyncio.to_thread(_read)
 
 
 def cleanup_intermediate_files(response: any):